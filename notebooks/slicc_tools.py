@@ -2,8 +2,11 @@
 slicc_tools.py
 Last updated: 21 June 2021
 '''
+from functools import lru_cache
+
 import numpy as np
 from matplotlib import pyplot as plt
+from numba import cfunc, cuda, float64, njit, prange, vectorize
 
 
 def runge_kutta(x_i, func, dt = 0.1):
@@ -27,27 +30,71 @@ def runge_kutta(x_i, func, dt = 0.1):
     return x_f
 
 
+def runge_kutta_inplace(x, func, dt, k_1, k_2, k_3, k_4, tmp):
+    '''
+    Fourth-order Runge-Kutta method that advances x in place using caller-owned buffers, with the arguments:
+    x = current condition in vector form (numpy array), overwritten with the next condition
+    func = function governing the derivatives, called as func(v, out) and writing into out
+    dt = time step / step size
+    k_1, k_2, k_3, k_4, tmp = work arrays with the same shape as x
+    '''
+    
+    #Calculate the intermediary parameter values without allocating temporaries
+    func(x, k_1)
+    k_1 *= dt
+    np.multiply(k_1, 0.5, out = tmp)
+    tmp += x
+    
+    func(tmp, k_2)
+    k_2 *= dt
+    np.multiply(k_2, 0.5, out = tmp)
+    tmp += x
+    
+    func(tmp, k_3)
+    k_3 *= dt
+    np.add(x, k_3, out = tmp)
+    
+    func(tmp, k_4)
+    k_4 *= dt
+    
+    #Calculate the final condition of the system as x + (k_1 + 2*k_2 + 2*k_3 + k_4) / 6
+    k_2 += k_3
+    k_2 *= 2
+    k_2 += k_1
+    k_2 += k_4
+    k_2 /= 6
+    x += k_2
+    
+    return x
+
+
+#Compiled version of runge_kutta for use with governing equations that are compiled with @njit
+#Not cached on disk, since every compiled func is a new type in each session and would only add cache entries
+runge_kutta_jit = njit(runge_kutta)
+
+
 def get_real_grid(x_min, x_max, num):
     '''
-    Returns a square xy grid grid in a given interval with arguments:
+    Returns the x and y coordinates of a square grid in a given interval as a tuple of two flat arrays (X, Y) with arguments:
     x_min, x_max = boundaries along one axis
     num = number of grid points along one axis, i.e. total number of points = num * num
     '''
     
-    #Create arrays of xy coordinate values
-    x = np.linspace(x_min, x_max, num)
-    y = np.linspace(x_min, x_max, num)
+    #Create arrays of xy coordinate values covering the whole grid
+    X, Y = np.meshgrid(np.linspace(x_min, x_max, num), np.linspace(x_min, x_max, num))
     
-    return [[a, b] for a in x for b in y]
+    return X.ravel(), Y.ravel()
 
 
-def plot_direction_field(func, x_min, x_max, num, d1 = 12, d2 = 10):
+def plot_direction_field(func, x_min, x_max, num, d1 = 12, d2 = 10, tile = 16384):
     '''
     Plots the direction field of a given function with arguments:
-    func = governing equation which should return a 2D vector with x_deriv, y_deriv
+    func = governing equation which should return a 2D vector with x_deriv, y_deriv; it is first called with a (2, N)
+           array of grid points and should then work elementwise, otherwise it is called once per grid point
     x_min, x_max = the graphing boundaries along one axis
     num = number of grid points along one axis, i.e. total number of points = num * num
     d1, d2 = dimensions of the pyplot figure, defaults to 12x10
+    tile = number of grid points passed to func at once, defaults to 16384
     '''
     
     #Format figure for plotting
@@ -62,15 +109,63 @@ def plot_direction_field(func, x_min, x_max, num, d1 = 12, d2 = 10):
     plt.axhline(y=0, color='k', linewidth=1)
     plt.axvline(x=0, color='k', linewidth=1)
     
-    #Create loop for plotting the direction field
-    for x in get_real_grid(x_min, x_max, num):
-        #Plot arrows with length representing the derivative at a given point
-        plt.arrow(x[0], x[1], 0.02*func(x)[0], 0.02*func(x)[1], \
-                  width = 0.001, head_width = 0.05, ec = 'k', fc = 'k', alpha = 1)
+    if tile < 1:
+        raise ValueError('tile must be at least 1')
+    
+    #Evaluate the derivative on the grid in tiles so that the temporaries created by func stay in cache
+    X, Y = get_real_grid(x_min, x_max, num)
+    U = np.empty_like(X)
+    V = np.empty_like(Y)
+    
+    #Probe func once on the first tile to decide whether it works elementwise on arrays of grid points
+    try:
+        U_tile, V_tile = func(np.array([X[:tile], Y[:tile]]))
+        vectorised = True
+    except (ValueError, TypeError):
+        vectorised = False
+    
+    if vectorised:
+        for i in range(0, X.size, tile):
+            if i > 0:
+                U_tile, V_tile = func(np.array([X[i:i+tile], Y[i:i+tile]]))
+            
+            #Constant components, e.g. theta_deriv = 1, are stretched over the whole tile
+            U[i:i+tile] = np.broadcast_to(U_tile, U[i:i+tile].shape)
+            V[i:i+tile] = np.broadcast_to(V_tile, V[i:i+tile].shape)
+    else:
+        #Fall back to one call per point for functions that only accept a single 2D vector
+        for i in range(X.size):
+            U[i], V[i] = func(np.array([X[i], Y[i]]))
+    
+    #Plot arrows with length representing the derivative at every grid point in a single call
+    plt.quiver(X, Y, 0.02*U, 0.02*V, angles = 'xy', scale_units = 'xy', scale = 1, \
+               width = 0.003, color = 'k')
     
     return
 
 
+def trajectory_values(func, x_0, t, dt = 0.1):
+    '''
+    Returns arrays of the x and y values of a single trajectory of a system with arguments:
+    func = governing equation which should return a 2D vector with x_deriv, y_deriv
+    x_0 = initial condition in 2D vector form
+    t = number of steps to take, i.e. t + 1 points including the initial condition
+    dt = time step / step size, defaults to 0.1
+    '''
+    
+    #Create arrays holding the points of the trajectory, starting with the initial condition
+    xs = np.empty(t+1, dtype = np.float64)
+    ys = np.empty(t+1, dtype = np.float64)
+    xs[0], ys[0] = x_0[0], x_0[1]
+    
+    for step in range(1, t+1):
+        #Retrieve the next value of the system using fourth-order Runge-Kutta
+        x_0 = runge_kutta(x_0, func, dt)
+        xs[step], ys[step] = x_0[0], x_0[1]
+    
+    return xs, ys
+
+
 def plot_trajectory(func, x_0, t, dt = 0.1, c = 'r'):
     '''
     Plots a single trajectory of a system from a given initial condition with arguments:
@@ -81,19 +176,24 @@ def plot_trajectory(func, x_0, t, dt = 0.1, c = 'r'):
     c = colour of the graph, defaults to red
     '''
     
-    #Use plot instead of scatter for increased efficiency
-    for step in range(0, t+1):
-        plt.plot(x_0[0], x_0[1], 'o', ms = 3, color = c, alpha = 1)
+    #Integrate the trajectory first, then plot it in a single call
+    xs, ys = trajectory_values(func, x_0, t, dt)
     
-        #Retrieve the next value of the system using fourth-order Runge-Kutta
-        x_0 = runge_kutta(x_0, func, dt)
+    plt.plot(xs, ys, 'o', ms = 3, color = c, alpha = 1)
     
     return
 
 
-def lorenz(v, r, sigma, b):
+def _time_values(t, time_step):
     '''
-    The governing equations of the Lorenz system for further use
+    Returns the float64 t values of np.arange(0, t, time_step), computed as whole multiples of time_step
+    '''
+    return np.arange(int(np.ceil(t / time_step)), dtype = np.float64) * time_step
+
+
+def lorenz(v, r, sigma, b, out = None):
+    '''
+    The governing equations of the Lorenz system for further use; the derivatives are written into out if given
     '''
     x, y, z = v[0], v[1], v[2]
     
@@ -101,66 +201,418 @@ def lorenz(v, r, sigma, b):
     y_deriv = r*x - y - x*z
     z_deriv = x*y - b*z
     
-    return np.array([x_deriv, y_deriv, z_deriv])
+    if out is None:
+        return np.array([x_deriv, y_deriv, z_deriv])
+    
+    #Fill the caller's buffer instead of allocating a new array
+    out[0], out[1], out[2] = x_deriv, y_deriv, z_deriv
+    
+    return out
+
+
+def make_lorenz(r, sigma, b):
+    '''
+    Returns the governing equations of the Lorenz system compiled with fixed parameters r, sigma and b
+    '''
+    
+    #The parameters are captured as compile-time constants of the compiled function
+    @njit
+    def lorenz_fixed(v):
+        x, y, z = v[0], v[1], v[2]
+        
+        x_deriv = sigma * (y - x)
+        y_deriv = r*x - y - x*z
+        z_deriv = x*y - b*z
+        
+        return np.array([x_deriv, y_deriv, z_deriv])
+    
+    return lorenz_fixed
+
+
+@njit
+def _jit_loop(func, v, dt, num):
+    '''
+    Iterates a compiled system num times and returns an array of the visited coordinates
+    '''
+    dim_values = np.empty((v.shape[0], num), dtype = np.float64)
+    
+    for step in range(num):
+        dim_values[:, step] = v
+        v = runge_kutta_jit(v, func, dt)
+    
+    return dim_values
+
+
+def jit_values(func, t, time_step = 0.01, v_0 = [0, 1, 0]):
+    '''
+    Returns the coordinate and t values of a system compiled with @njit, e.g. from make_lorenz, with the arguments:
+    func = compiled governing equations taking and returning a vector
+    t = length of time over which the system is iterated
+    time_step = length of a single time step used for iteration; defaults to 0.01
+    v_0 = initial condition in vector form; defaults to (0, 1, 0)
+    '''
+    
+    #Create array of the time values
+    t_values = _time_values(t, time_step)
+    
+    dim_values = _jit_loop(func, np.array(v_0, dtype = np.float64), float(time_step), len(t_values))
+    
+    return dim_values, t_values
+
+
+@njit(parallel = True)
+def _jit_batch_loop(func, v_0, dt, num, lanes):
+    '''
+    Iterates a batch of trajectories of a compiled system num times, splitting the batch into groups of lanes across threads
+    '''
+    dim, batch = v_0.shape
+    traj = np.empty((num, dim, batch), dtype = np.float64)
+    
+    #Each thread advances a contiguous group of lanes, so func works on short arrays that LLVM can vectorise
+    for group in prange((batch + lanes - 1) // lanes):
+        start = group * lanes
+        stop = min(start + lanes, batch)
+        v = v_0[:, start:stop].copy()
+        
+        for step in range(num):
+            traj[step, :, start:stop] = v
+            v = runge_kutta_jit(v, func, dt)
+    
+    return traj
+
+
+def jit_values_batch(func, t, v0_batch, time_step = 0.01, lanes = 256):
+    '''
+    Returns an array of shape (steps, B, n) holding B trajectories of a compiled system and the t values with the arguments:
+    func = governing equations compiled with @njit(fastmath = True); called with an (n, L) array whose rows are
+           the coordinates of L trajectories, it should return an (n, L) array of derivatives, e.g. built with np.vstack
+    t = length of time over which the system is iterated
+    v0_batch = initial conditions in vector form stacked into shape (B, n)
+    time_step = length of a single time step used for iteration; defaults to 0.01
+    lanes = number of trajectories advanced together by one thread; defaults to 256
+    Elementary functions in func should use NumPy on the coordinate arrays (np.sin rather than math.sin), so that
+    with fastmath they can be compiled to vectorised math routines instead of one scalar call per trajectory.
+    '''
+    if not getattr(func, 'targetoptions', {}).get('fastmath'):
+        raise TypeError('func must be compiled with @njit(fastmath = True)')
+    
+    if lanes < 1:
+        raise ValueError('lanes must be at least 1')
+    
+    #Create array of the time values
+    t_values = _time_values(t, time_step)
+    
+    #Store each coordinate of the batch as a contiguous row so that the lanes are adjacent in memory
+    v_0 = np.ascontiguousarray(np.asarray(v0_batch, dtype = np.float64).T)
+    
+    traj = _jit_batch_loop(func, v_0, float(time_step), len(t_values), int(lanes))
+    
+    return traj.transpose(0, 2, 1), t_values
+
+
+@njit(cache = True, fastmath = True)
+def _lorenz(x, y, z, r, sigma, b):
+    '''
+    Scalar form of the Lorenz equations used by the compiled integrator
+    '''
+    x_deriv = sigma * (y - x)
+    
+    #r*x - x*z written as (r - z)*x so that it contracts to a single fused multiply-add
+    y_deriv = (r - z)*x - y
+    z_deriv = x*y - b*z
+    
+    return x_deriv, y_deriv, z_deriv
+
+
+@njit(cache = True, fastmath = True)
+def _rk4_lorenz_step(x, y, z, r, sigma, b, dt):
+    '''
+    Single fourth-order Runge-Kutta step of the Lorenz system written out in scalars
+    '''
+    
+    #Calculate the intermediary parameter values for each coordinate
+    k_1x, k_1y, k_1z = _lorenz(x, y, z, r, sigma, b)
+    k_2x, k_2y, k_2z = _lorenz(x + 0.5*dt*k_1x, y + 0.5*dt*k_1y, z + 0.5*dt*k_1z, r, sigma, b)
+    k_3x, k_3y, k_3z = _lorenz(x + 0.5*dt*k_2x, y + 0.5*dt*k_2y, z + 0.5*dt*k_2z, r, sigma, b)
+    k_4x, k_4y, k_4z = _lorenz(x + dt*k_3x, y + dt*k_3y, z + dt*k_3z, r, sigma, b)
+    
+    #Calculate the final condition of the system
+    x_f = x + dt/6 * (k_1x + 2*k_2x + 2*k_3x + k_4x)
+    y_f = y + dt/6 * (k_1y + 2*k_2y + 2*k_3y + k_4y)
+    z_f = z + dt/6 * (k_1z + 2*k_2z + 2*k_3z + k_4z)
+    
+    return x_f, y_f, z_f
+
+
+@njit(cache = True)
+def _lorenz_loop(x, y, z, r, sigma, b, dt, num, num_transient):
+    '''
+    Iterates the Lorenz system past num_transient steps and returns a (3, num) array of the following (x, y, z) values
+    '''
+    
+    #Integrate through the transient without storing it
+    for step in range(num_transient):
+        x, y, z = _rk4_lorenz_step(x, y, z, r, sigma, b, dt)
+    
+    dim_values = np.empty((3, num), dtype = np.float64)
+    
+    for step in range(num):
+        dim_values[0, step] = x
+        dim_values[1, step] = y
+        dim_values[2, step] = z
+        x, y, z = _rk4_lorenz_step(x, y, z, r, sigma, b, dt)
+    
+    return dim_values
 
 
-def lorenz_values(r, sigma, b, t, time_step = 0.01, transient = 0, v_0 = [0, 1, 0]):
+def lorenz_values(r, sigma, b, t, time_step = 0.01, transient = 0, v_0 = [0, 1, 0], jit = True):
     '''
-    Returns lists of the (x, y, z) and t values of the Lorenz system with the given arguments:
+    Returns a (3, N) array of the (x, y, z) values and an array of the t values of the Lorenz system with the given arguments:
     r = the Rayleigh number
     sigma = the Prandtl number
     b = the value of parameter b
     t = length of time over which the system is iterated
     time_step = length of a single time step used for iteration; defaults to 0.01
-    transient = duration deleted from the beginning of the lists to remove a transient
+    transient = duration deleted from the beginning of the arrays to remove a transient; defaults to 0
     v_0 = initial condition in (x, y, z) format; defaults to (0, 1, 0)
+    jit = use the compiled integrator; False falls back to pure NumPy, defaults to True
     '''
     
-    #Create lists of the (x, y, z) and time values
-    dim_values = [[], [], []]
-    t_values = []
+    #Calculate the time values up front, matching np.arange(0, t, time_step)
+    t_values = _time_values(t, time_step)
+    num = len(t_values)
+    
+    #Split the steps into the discarded transient, i.e. exactly the points with t < transient, and the stored remainder
+    num_transient = int(np.searchsorted(t_values, transient))
+    num_keep = num - num_transient
+    t_values = t_values[num_transient:]
+    
+    #Declare initial condition with a fixed float64 type so that the compiled loop is specialised once
+    v = np.array(v_0, dtype = np.float64)
+    
+    if jit:
+        #Iterate over time steps in compiled code
+        dim_values = _lorenz_loop(v[0], v[1], v[2], float(r), float(sigma), float(b), float(time_step),
+                                  num_keep, num_transient)
+        
+        return dim_values, t_values
     
     #Define the Lorenz equations with fixed parameters
-    def lorenz_var(v):
-        return lorenz(v, r = r, sigma = sigma, b = b)
+    def lorenz_var(v, out):
+        lorenz(v, r = r, sigma = sigma, b = b, out = out)
+    
+    #Allocate the trajectory and the Runge-Kutta work buffers once; each coordinate is a contiguous row
+    dim_values = np.empty((3, num_keep), dtype = np.float64)
+    k_1, k_2, k_3, k_4, tmp = np.empty((5, 3), dtype = np.float64)
     
-    #Declare initial condition
-    v = v_0
+    #Integrate through the transient without storing it
+    for step in range(num_transient):
+        runge_kutta_inplace(v, lorenz_var, time_step, k_1, k_2, k_3, k_4, tmp)
     
-    #Iterate over time steps
-    for step in np.arange(0, t, time_step):
-        t_values.append(step)
+    #Iterate over the remaining time steps
+    for step in range(num_keep):
+        dim_values[:, step] = v
         
-        #Add new values of (x, y, z) to the list dim_values
-        for m in range(3):
-            dim_values[m].append(v[m])
-     
-        #Retrieve the next coordinates using fourth-order Runge-Kutta
-        v = runge_kutta(v, lorenz_var, dt = time_step)
+        #Advance the coordinates in place using fourth-order Runge-Kutta
+        runge_kutta_inplace(v, lorenz_var, time_step, k_1, k_2, k_3, k_4, tmp)
     
     return dim_values, t_values
 
 
+@njit(parallel = True, cache = True, fastmath = True)
+def _lorenz_batch_loop(v_0, r, sigma, b, dt, num, lanes):
+    '''
+    Iterates a batch of Lorenz trajectories given as a (3, B) array num times, advancing groups of lanes in lockstep
+    '''
+    batch = v_0.shape[1]
+    traj = np.empty((num, 3, batch), dtype = np.float64)
+    
+    #Each thread takes a contiguous group of lanes and keeps their coordinates in short arrays
+    for group in prange((batch + lanes - 1) // lanes):
+        start = group * lanes
+        stop = min(start + lanes, batch)
+        xs = v_0[0, start:stop].copy()
+        ys = v_0[1, start:stop].copy()
+        zs = v_0[2, start:stop].copy()
+        
+        for step in range(num):
+            #Each coordinate of the group is stored as one contiguous row
+            traj[step, 0, start:stop] = xs
+            traj[step, 1, start:stop] = ys
+            traj[step, 2, start:stop] = zs
+            
+            #The lanes are independent, so LLVM can vectorise this loop across them
+            for i in range(stop - start):
+                xs[i], ys[i], zs[i] = _rk4_lorenz_step(xs[i], ys[i], zs[i], r, sigma, b, dt)
+    
+    return traj
+
+
+def lorenz_values_batch(r, sigma, b, t, v0_batch, time_step = 0.01, lanes = 256):
+    '''
+    Returns an array of shape (steps, B, 3) holding B Lorenz trajectories and the t values with the arguments:
+    r = the Rayleigh number
+    sigma = the Prandtl number
+    b = the value of parameter b
+    t = length of time over which the system is iterated
+    v0_batch = initial conditions in (x, y, z) format stacked into shape (B, 3)
+    time_step = length of a single time step used for iteration; defaults to 0.01
+    lanes = number of trajectories advanced together by one thread; defaults to 256
+    '''
+    if lanes < 1:
+        raise ValueError('lanes must be at least 1')
+    
+    #Create array of the time values
+    t_values = _time_values(t, time_step)
+    
+    #Store each coordinate of the batch as a contiguous row so that the lanes are adjacent in memory
+    v_0 = np.ascontiguousarray(np.asarray(v0_batch, dtype = np.float64).T)
+    
+    traj = _lorenz_batch_loop(v_0, float(r), float(sigma), float(b), float(time_step), len(t_values), int(lanes))
+    
+    return traj.transpose(0, 2, 1), t_values
+
+
+@cuda.jit
+def _lorenz_cuda_kernel(v_0, traj, r, sigma, b, dt, num):
+    '''
+    CUDA kernel in which each thread integrates one Lorenz trajectory, writing it to traj[step, dim, lane]
+    '''
+    lane = cuda.grid(1)
+    
+    if lane < v_0.shape[0]:
+        #The state of a trajectory is kept in registers for the whole integration
+        x, y, z = v_0[lane, 0], v_0[lane, 1], v_0[lane, 2]
+        
+        for step in range(num):
+            #Neighbouring threads write to neighbouring addresses, so stores are coalesced
+            traj[step, 0, lane] = x
+            traj[step, 1, lane] = y
+            traj[step, 2, lane] = z
+            x, y, z = _rk4_lorenz_step(x, y, z, r, sigma, b, dt)
+
+
+def lorenz_values_cuda(r, sigma, b, t, v0_batch, time_step = 0.01, threads = 256):
+    '''
+    Returns an array of shape (steps, B, 3) holding B Lorenz trajectories integrated on the GPU and the t values with the arguments:
+    r = the Rayleigh number
+    sigma = the Prandtl number
+    b = the value of parameter b
+    t = length of time over which the system is iterated
+    v0_batch = initial conditions in (x, y, z) format stacked into shape (B, 3)
+    time_step = length of a single time step used for iteration; defaults to 0.01
+    threads = number of threads per block; defaults to 256
+    Requires a CUDA-capable GPU.
+    '''
+    if not cuda.is_available():
+        raise RuntimeError('lorenz_values_cuda requires a CUDA-capable GPU')
+    
+    #Create array of the time values
+    t_values = _time_values(t, time_step)
+    
+    v0_batch = np.ascontiguousarray(v0_batch, dtype = np.float64)
+    batch = v0_batch.shape[0]
+    
+    #Store the trajectories with the batch dimension last so that each step is written in one coalesced row
+    d_v0 = cuda.to_device(v0_batch)
+    d_traj = cuda.device_array((len(t_values), 3, batch), dtype = np.float64)
+    
+    blocks = (batch + threads - 1) // threads
+    _lorenz_cuda_kernel[blocks, threads](d_v0, d_traj, float(r), float(sigma), float(b), float(time_step), len(t_values))
+    
+    return d_traj.copy_to_host().transpose(0, 2, 1), t_values
+
+
+@lru_cache(maxsize = None)
+def _lorenz_lsoda():
+    '''
+    Returns the Lorenz equations compiled in the form expected by numbalsoda, with p = (sigma, r, b)
+    '''
+    from numbalsoda import lsoda_sig
+    
+    @cfunc(lsoda_sig, cache = True)
+    def lorenz_rhs(t, u, du, p):
+        du[0] = p[0] * (u[1] - u[0])
+        du[1] = p[1]*u[0] - u[1] - u[0]*u[2]
+        du[2] = u[0]*u[1] - p[2]*u[2]
+    
+    return lorenz_rhs
+
+
+def lorenz_values_lsoda(r, sigma, b, t, time_step = 0.01, v_0 = [0, 1, 0], rtol = 1e-8, atol = 1e-8):
+    '''
+    Returns arrays of the (x, y, z) and t values of the Lorenz system using the adaptive LSODA solver with the arguments:
+    r = the Rayleigh number
+    sigma = the Prandtl number
+    b = the value of parameter b
+    t = length of time over which the system is iterated
+    time_step = spacing of the returned t values; defaults to 0.01
+    v_0 = initial condition in (x, y, z) format; defaults to (0, 1, 0)
+    rtol, atol = relative and absolute tolerances of the solver; default to 1e-8
+    Requires the optional numbalsoda package.
+    '''
+    #numbalsoda is imported here since importing it compiles its own solvers
+    try:
+        from numbalsoda import lsoda
+    except ImportError:
+        raise ImportError('lorenz_values_lsoda requires the numbalsoda package')
+    
+    #Create array of the time values at which the solution is returned
+    t_values = _time_values(t, time_step)
+    
+    params = np.array([sigma, r, b], dtype = np.float64)
+    
+    usol, success = lsoda(_lorenz_lsoda().address, np.array(v_0, dtype = np.float64), t_values,
+                          data = params, rtol = rtol, atol = atol)
+    
+    if not success:
+        raise RuntimeError('LSODA failed to integrate the Lorenz system')
+    
+    return usol.T, t_values
+
+
+@vectorize([float64(float64, float64)], cache = True, fastmath = True)
+def logistic_step(r, x):
+    '''
+    Compiled ufunc returning one iteration of the logistic equation, broadcasting over r and x
+    '''
+    return r * x * (1.0 - x)
+
+
 def logistic(r, x_input = np.linspace(0, 1, 100)):
     '''
-    Returns a list of the x_n values after one iteration of the logistic equation with the arguments:
+    Returns an array of the x_n values after one iteration of the logistic equation with the arguments:
     r = the chosen value of parameter r
-    x_input = list of x values to use as initial conditions; defaults to 100 evenly spaced values in the interval [0, 1]
+    x_input = array of x values to use as initial conditions; defaults to 100 evenly spaced values in the interval [0, 1]
     '''
     
-    #Create an empty list to hold x_n values
-    x_n = []
+    #Apply the logistic equation to every x value at once
+    return logistic_step(r, np.asarray(x_input, dtype = np.float64))
+
+
+@njit(parallel = True, cache = True, fastmath = True)
+def _logistic_map(r_values, N, x_input):
+    '''
+    Iterates the logistic equation N times from x_input for every value in r_values
+    '''
+    x_values = np.empty(r_values.shape[0], dtype = np.float64)
     
-    #Iterate over the given x_input list
-    for x in x_input:
-        x_n.append(r * x * (1 - x))
-             
-    return x_n
+    #Each value of r is independent, so they are split across threads
+    for i in prange(r_values.shape[0]):
+        x = x_input
+        r = r_values[i]
+        
+        for n in range(N):
+            x = logistic_step(r, x)
         
+        x_values[i] = x
+    
+    return x_values
+
 
 def logistic_map(S, N, r_lim = [1, 4], x_input = np.random.uniform(0, 1)):
     '''
-    Returns two lists (r, x) of the logistic map with the arguments:
+    Returns two arrays (r, x) of the logistic map with the arguments:
     S = the number of r values used for plotting
     N = the number of iterations per value of r
     x_input = the initial value of x; defaults to a random value between 0 and 1
@@ -169,18 +621,7 @@ def logistic_map(S, N, r_lim = [1, 4], x_input = np.random.uniform(0, 1)):
     #Create list of r values in the r_lim range; defaults to [0, 4]
     r_values = np.linspace(r_lim[0], r_lim[1], S)
     
-    #Declare empty list of x values
-    x_values = []
-    
-    #Iterate system N times for each value of r
-    for r in r_values:
-        i = 0
-        
-        #Choose randomised x value as the initial condition
-        x = x_input
-        while i < N:
-            x = r * x * (1 - x)
-            i += 1
-        x_values.append(x)
+    #Iterate the system N times for each value of r in compiled code
+    x_values = _logistic_map(r_values, int(N), float(x_input))
     
-    return r_values, x_values
\ No newline at end of file
+    return r_values, x_values